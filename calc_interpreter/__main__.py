@@ -1,7 +1,13 @@
-from calc_interpreter.evaluator import interpret
+import sys
+import argparse
+from calc_interpreter.evaluator import Evaluator, interpret
+from calc_interpreter.cache import ResultCache
+from calc_interpreter.exception import InterpreterError
+from calc_interpreter.pipeline import evaluate_csv, CHUNK_SIZE
+from calc_interpreter.profiler import profile
 
 
-def main():  # pragma: no cover
+def repl():  # pragma: no cover
     while True:
         try:
             data = input(':: ')
@@ -12,5 +18,50 @@ def main():  # pragma: no cover
             break
 
 
+def csv_command(arguments):  # pragma: no cover
+    try:
+        with open(arguments.input, newline='') as source, open(arguments.output, 'w', newline='') as destination:
+            stats = evaluate_csv(source, destination, arguments.formula, arguments.chunk_size)
+    except (InterpreterError, OSError) as err:
+        sys.exit(err)
+    print(stats, file=sys.stderr)
+
+
+def profile_command(arguments):  # pragma: no cover
+    try:
+        evaluator = profile(arguments.expression, arguments.repeat)
+    except InterpreterError as err:
+        sys.exit(err)
+    print(evaluator.annotate())
+    if arguments.collapsed:
+        with open(arguments.collapsed, 'w') as file:
+            file.write(evaluator.collapsed() + '\n')
+
+
+def main():  # pragma: no cover
+    parser = argparse.ArgumentParser(prog='calc_interpreter')
+    parser.add_argument('--cache', metavar='FILE', help='cache results of expensive closed expressions in FILE')
+    commands = parser.add_subparsers(dest='command')
+    csv_parser = commands.add_parser('csv', help='evaluate formulas over CSV columns')
+    csv_parser.add_argument('input', help='input CSV file with header')
+    csv_parser.add_argument('output', help='output CSV file')
+    csv_parser.add_argument('-f', '--formula', action='append', required=True,
+                            help='derived column, e.g. "total = price * qty", may be repeated')
+    csv_parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='rows evaluated at once')
+    profile_parser = commands.add_parser('profile', help='time evaluation of each node of expression')
+    profile_parser.add_argument('expression')
+    profile_parser.add_argument('-n', '--repeat', type=int, default=1, help='number of evaluations')
+    profile_parser.add_argument('--collapsed', metavar='FILE', help='write collapsed stacks for flamegraph tools')
+    arguments = parser.parse_args()
+    if arguments.cache:
+        Evaluator(None).cache = ResultCache(arguments.cache)
+    if arguments.command == 'csv':
+        csv_command(arguments)
+    elif arguments.command == 'profile':
+        profile_command(arguments)
+    else:
+        repl()
+
+
 if __name__ == '__main__':
     main()
@@ -0,0 +1,182 @@
+"""
+Persistent cache of results of closed expressions
+
+Expressions without variables always evaluate to the same result, so results of
+the expensive ones are stored in SQLite database keyed by hash of canonical form
+of the tree. The database runs in WAL mode and writes are serialized by SQLite,
+so single cache file can be shared by concurrent processes. Total size of cached
+values is capped and kept up to date in the meta table, least recently used
+results are evicted first. Access time is refreshed at most once per access
+interval, so cache hits are mostly read-only.
+"""
+import time
+import struct
+import sqlite3
+import hashlib
+from weakref import WeakKeyDictionary
+from calc_interpreter.traversal import NodeTraversal
+
+MAX_SIZE = 256 * 1024 * 1024
+MIN_DURATION = 0.01
+ACCESS_INTERVAL = 60
+
+
+class CanonicalForm(NodeTraversal):
+    """
+    Canonical prefix notation of the tree, None if tree is not closed expression
+
+    Numbers are written in hexadecimal to avoid quadratic decimal conversion.
+    """
+    def default(self, node):
+        return None
+
+    def traverse_number(self, node):
+        """
+        :type node: Number
+        """
+        value = node.value
+        if type(value) is int:
+            return f'{value:x}'
+        if value.is_integer():
+            return f'{int(value):x}'
+        return value.hex()
+
+    def traverse_binary_operator(self, node):
+        """
+        :type node: BinaryOperator
+        """
+        left = self.traverse(node.left)
+        right = left and self.traverse(node.right)
+        if right:
+            return f'({node.operator.type.name} {left} {right})'
+
+    def traverse_unary_operator(self, node):
+        """
+        :type node: UnaryOperator
+        """
+        expr = self.traverse(node.expr)
+        if expr:
+            return f'({node.operator.type.name} {expr})'
+
+
+def encode(value):
+    if type(value) is int:
+        return 'int', value.to_bytes(value.bit_length() // 8 + 1, 'little', signed=True)
+    return 'float', struct.pack('<d', value)
+
+
+def decode(kind, data):
+    if kind == 'int':
+        return int.from_bytes(data, 'little', signed=True)
+    return struct.unpack('<d', data)[0]
+
+
+class ResultCache:
+    path: str
+    max_size: int
+    min_duration: float
+    access_interval: float
+
+    def __init__(self, path, max_size=MAX_SIZE, min_duration=MIN_DURATION, access_interval=ACCESS_INTERVAL):
+        """
+        :type path: str
+        :param max_size: maximum total size of cached values in bytes
+        :param min_duration: results computed faster than this (in seconds) are not cached
+        :param access_interval: access time of a result is refreshed only if older than this (in seconds)
+        """
+        self.path = path
+        self.max_size = max_size
+        self.min_duration = min_duration
+        self.access_interval = access_interval
+        self.keys = WeakKeyDictionary()
+        self.connection = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS results ('
+                                'key TEXT PRIMARY KEY, kind TEXT, value BLOB, size INTEGER, accessed REAL)')
+        self.connection.execute('CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed)')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS meta ('
+                                'id INTEGER PRIMARY KEY CHECK (id = 0), total INTEGER)')
+        self.connection.execute('INSERT OR IGNORE INTO meta SELECT 0, COALESCE(SUM(size), 0) FROM results')
+
+    def close(self):
+        self.connection.close()
+
+    def key(self, tree):
+        """
+        Hash of canonical form of the tree, None if tree is not closed expression
+
+        :type tree: NodeAST
+        :rtype: Optional[str]
+        """
+        try:
+            return self.keys[tree]
+        except KeyError:
+            pass
+        canonical = CanonicalForm().traverse(tree)
+        key = canonical and hashlib.sha256(canonical.encode()).hexdigest()
+        self.keys[tree] = key
+        return key
+
+    def get(self, key):
+        """
+        :type key: str
+        """
+        row = self.connection.execute('SELECT kind, value, accessed FROM results WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        kind, data, accessed = row
+        now = time.time()
+        if now - accessed >= self.access_interval:
+            self.connection.execute('UPDATE results SET accessed = ? WHERE key = ? AND accessed = ?',
+                                    (now, key, accessed))
+        return decode(kind, data)
+
+    def put(self, key, value):
+        """
+        :type key: str
+        """
+        kind, data = encode(value)
+        if len(data) > self.max_size:
+            return
+        connection = self.connection
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            replaced = connection.execute('SELECT size FROM results WHERE key = ?', (key,)).fetchone()
+            connection.execute('INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)',
+                               (key, kind, data, len(data), time.time()))
+            total = connection.execute('SELECT total FROM meta').fetchone()[0] + len(data)
+            if replaced:
+                total -= replaced[0]
+            if total > self.max_size:
+                evicted = []
+                for old_key, size in connection.execute('SELECT key, size FROM results ORDER BY accessed'):
+                    if total <= self.max_size:
+                        break
+                    evicted.append((old_key,))
+                    total -= size
+                connection.executemany('DELETE FROM results WHERE key = ?', evicted)
+            connection.execute('UPDATE meta SET total = ?', (total,))
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+
+    def evaluate(self, tree, compute):
+        """
+        Cached result of closed expression, compute is called on cache miss or if tree is not closed
+
+        :type tree: NodeAST
+        :type compute: Callable[[], object]
+        """
+        key = self.key(tree)
+        if key is None:
+            return compute()
+        result = self.get(key)
+        if result is not None:
+            return result
+        start = time.perf_counter()
+        result = compute()
+        if result is not None and time.perf_counter() - start >= self.min_duration:
+            self.put(key, result)
+        return result
@@ -0,0 +1,84 @@
+"""
+Compilation of AST into Python closures
+
+Every node is turned into a function taking the evaluator memory and returning
+the value of the node, so that repeated evaluation skips method dispatch of
+the tree traversal. Semantics are the same as in the Evaluator default mode.
+"""
+from typing import Callable
+from calc_interpreter.traversal import NodeTraversal
+from calc_interpreter.exception import InterpreterError, EmptyVariableError
+from calc_interpreter.operations import strip_decimal, specialized_operation, unary_operation
+
+CompiledNode = Callable[[dict], object]
+
+
+class Compiler(NodeTraversal):
+    def compile(self, tree):
+        """
+        :type tree: NodeAST
+        :rtype: CompiledNode
+        """
+        return self.traverse(tree)
+
+    def traverse_number(self, node):
+        """
+        :type node: Number
+        """
+        value = strip_decimal(node.value)
+
+        def number(memory):
+            return value
+        return number
+
+    def traverse_binary_operator(self, node):
+        """
+        :type node: BinaryOperator
+        """
+        left = self.traverse(node.left)
+        right = self.traverse(node.right)
+        operation = specialized_operation(node.operator.type)
+
+        def binary_operator(memory):
+            return operation(left(memory), right(memory))
+        return binary_operator
+
+    def traverse_unary_operator(self, node):
+        """
+        :type node: UnaryOperator
+        """
+        expr = self.traverse(node.expr)
+        operator = node.operator.type
+
+        def unary_operator(memory):
+            return unary_operation(operator, expr(memory))
+        return unary_operator
+
+    def traverse_variable_assignment(self, node):
+        """
+        :type node: VariableAssignment
+        """
+        name = node.left.value
+        right = self.traverse(node.right)
+
+        def variable_assignment(memory):
+            if name == 'ans':
+                raise InterpreterError('runtime error: trying to rewrite protected variable')
+            memory[name] = right(memory)
+        return variable_assignment
+
+    def traverse_variable(self, node):
+        """
+        :type node: Variable
+        """
+        name = node.value
+
+        def variable(memory):
+            try:
+                value = memory[name]
+            except KeyError:
+                raise InterpreterError(f'undefined variable: {name}')
+            if value is None:
+                raise EmptyVariableError
+            return value
+        return variable
@@ -1,36 +1,18 @@
-import math
-import operator as op_func
 from typing import List, Optional
-from calc_interpreter.lexer import Token
+from functools import partial
+from weakref import WeakKeyDictionary
+from dataclasses import dataclass, field
+from calc_interpreter.lexer import Token, Grammar
 from calc_interpreter.singleton import Singleton
 from calc_interpreter.traversal import NodeTraversal
 from calc_interpreter.exception import EmptyVariableError
 from calc_interpreter.parser import *
+from calc_interpreter.operations import strip_decimal, binary_operation, unary_operation
+from calc_interpreter.compiler import Compiler, CompiledNode
+from calc_interpreter.cache import ResultCache
+from calc_interpreter.formatter import Formatter, FORMATS
 
-
-def operator_func(operator):
-    operations = {
-        TokenType.BITWISE_OR: op_func.or_,
-        TokenType.BITWISE_XOR: op_func.xor,
-        TokenType.BITWISE_AND: op_func.and_,
-        TokenType.BITWISE_RIGHT_SHIFT: op_func.rshift,
-        TokenType.BITWISE_LEFT_SHIFT: op_func.lshift,
-        TokenType.PLUS: op_func.add,
-        TokenType.MINUS: op_func.sub,
-        TokenType.MUL: op_func.mul,
-        TokenType.DIV: op_func.truediv,
-        TokenType.FLOOR_DIV: op_func.floordiv,
-        TokenType.MODULUS: op_func.mod,
-        TokenType.POW: op_func.pow
-    }
-    return operations[operator]
-
-
-def strip_decimal(number):
-    frac, whole = math.modf(number)
-    if frac == 0:
-        return int(whole)
-    return number
+TIER_THRESHOLD = 1000
 
 
 class CommandRunner:
@@ -68,18 +50,90 @@ class CommandRunner:
         print('switching to mode:', mode)
         self.parent.mode = mode
 
+    def command_format(self, arguments):
+        """
+        :type arguments: List[Token]
+        """
+        usage = f'usage: format (%s) [digits]' % ' | '.join(FORMATS)
+        if not arguments or len(arguments) > 2:
+            raise InterpreterError(usage)
+        style = arguments[0].value
+        if style not in FORMATS:
+            raise InterpreterError(usage)
+        digits = self.parent.formatter.digits
+        if len(arguments) == 2:
+            digits = arguments[1].value
+            if type(digits) is not int or digits < 1:
+                raise InterpreterError(usage)
+        print('switching to format:', style)
+        self.parent.formatter = Formatter(style, digits)
+
+
+@dataclass
+class ExpressionStats:
+    evaluations: int = 0
+    tier: str = 'interpreted'
+    compiled: Optional[CompiledNode] = field(default=None, repr=False)
+
 
 class Evaluator(NodeTraversal, metaclass=Singleton):
     tree: NodeAST
     mode: str
     runner: CommandRunner
     memory: dict
+    threshold: Optional[int]
+    expressions: WeakKeyDictionary
+    cache: Optional[ResultCache]
+    formatter: Formatter
 
     def __init__(self, tree):
         self.tree = tree
         self.mode = 'default'
         self.runner = CommandRunner(self)
         self.memory = {'ans': None}
+        self.threshold = TIER_THRESHOLD
+        self.expressions = WeakKeyDictionary()
+        self.cache = None
+        self.formatter = Formatter()
+
+    def stats(self, tree=None):
+        """
+        Evaluation count and execution tier of parsed expression
+
+        :type tree: Optional[NodeAST]
+        :rtype: ExpressionStats
+        """
+        return self.expressions.get(tree or self.tree, ExpressionStats())
+
+    def execute(self, tree):
+        """
+        Interpret the tree, or run its compiled form once it was evaluated more than threshold times
+
+        :type tree: NodeAST
+        """
+        if self.mode != 'default' or self.threshold is None or isinstance(tree, Command):
+            return self.traverse(tree)
+        stats = self.expressions.get(tree)
+        if stats is None:
+            stats = self.expressions[tree] = ExpressionStats()
+        stats.evaluations += 1
+        if stats.compiled is None:
+            if stats.evaluations <= self.threshold:
+                return self.traverse(tree)
+            stats.compiled = Compiler().compile(tree)
+            stats.tier = 'compiled'
+        return stats.compiled(self.memory)
+
+    def cached(self, tree):
+        """
+        Evaluate the tree, serving closed expressions from the result cache
+
+        :type tree: NodeAST
+        """
+        if isinstance(tree, VariableAssignment) and tree.left.value != 'ans':
+            self.memory[tree.left.value] = self.cached(tree.right)
+            return None
+        return self.cache.evaluate(tree, partial(self.execute, tree))
 
     def traverse_number(self, node):
         """
@@ -94,24 +148,7 @@ class Evaluator(NodeTraversal, metaclass=Singleton):
         left = self.traverse(node.left)
         right = self.traverse(node.right)
         if self.mode == 'default':
-            try:
-                operation = operator_func(node.operator.type)
-                bitwise_operations = [
-                    TokenType.BITWISE_LEFT_SHIFT,
-                    TokenType.BITWISE_RIGHT_SHIFT,
-                    TokenType.BITWISE_XOR,
-                    TokenType.BITWISE_OR,
-                    TokenType.BITWISE_AND
-                ]
-                integers = [type(left) is int, type(right) is int]
-                if node.operator.type in bitwise_operations and not all(integers):
-                    raise InterpreterError('type error: operands must be integers')
-                result = operation(left, right)
-                if type(result) is complex:
-                    raise InterpreterError('complex numbers not supported!')
-                return strip_decimal(result)
-            except ZeroDivisionError:
-                raise InterpreterError('zero division')
+            return binary_operation(node.operator.type, left, right)
         elif self.mode == 'rpn':
             return f'{left} {right} {node.operator.value}'
 
@@ -121,14 +158,7 @@ class Evaluator(NodeTraversal, metaclass=Singleton):
         """
         right = self.traverse(node.expr)
         if self.mode == 'default':
-            if node.operator.type == TokenType.PLUS:
-                return +right
-            elif node.operator.type == TokenType.MINUS:
-                return -right
-            elif node.operator.type == TokenType.BITWISE_NOT:
-                if type(right) is not int:
-                    raise InterpreterError('type error: operand must be integer')
-                return ~right
+            return unary_operation(node.operator.type, right)
         elif self.mode == 'rpn':
             return f'{right} {node.operator.value}'
 
@@ -164,7 +194,10 @@ class Evaluator(NodeTraversal, metaclass=Singleton):
         if not tree:
             return ''
         try:
-            result = self.traverse(tree)
+            if self.cache is not None and self.mode == 'default':
+                result = self.cached(tree)
+            else:
+                result = self.execute(tree)
         except EmptyVariableError:
             return
         if result is not None:
@@ -181,10 +214,10 @@ def interpret(data):
         result = evaluator.evaluate()
         if evaluator.mode == 'tokens':
             for token in lexer.tokens:
-                if token.value == 'mode':
+                if Grammar.is_keyword(token.value):
                     break
                 print(token)
         elif result or result == 0:
-            print(result)
+            print(evaluator.formatter.format(result))
     except InterpreterError as err:
         print(err)
@@ -0,0 +1,136 @@
+"""
+Output formatting of results
+
+Converting huge integers to decimal with str() is quadratic, so huge integers are
+printed in truncated scientific notation by default. Full decimal output uses
+divide and conquer conversion built on the decimal module, whose multiplication
+is subquadratic. Hexadecimal and binary output is linear.
+"""
+import decimal
+
+FORMATS = ['default', 'sci', 'hex', 'bin', 'full']
+DIGITS = 16
+MAX_DIGITS = 4000
+LOG10_2 = 0.30102999566398120
+BITLIM = 128
+BOUNDARY = decimal.Decimal('1.000000001')
+
+
+def _context(precision):
+    context = decimal.Context(prec=precision, Emax=decimal.MAX_EMAX, Emin=decimal.MIN_EMIN)
+    context.traps[decimal.Inexact] = precision == decimal.MAX_PREC
+    return context
+
+
+def int_to_decimal_string(number):
+    """
+    Decimal representation of integer in subquadratic time
+
+    :type number: int
+    :rtype: str
+    """
+    if number.bit_length() * LOG10_2 < MAX_DIGITS:
+        return str(number)
+    powers = {}
+
+    def power_of_two(width):
+        result = powers.get(width)
+        if result is None:
+            if width <= BITLIM:
+                result = decimal.Decimal(2) ** width
+            elif width - 1 in powers:
+                result = powers[width - 1] * 2
+            else:
+                half = width >> 1
+                result = power_of_two(half) * power_of_two(width - half)
+            powers[width] = result
+        return result
+
+    def convert(value, width):
+        if width <= BITLIM:
+            return decimal.Decimal(value)
+        half = width >> 1
+        high = value >> half
+        low = value - (high << half)
+        return convert(low, half) + convert(high, width - half) * power_of_two(half)
+
+    with decimal.localcontext(_context(decimal.MAX_PREC)):
+        result = convert(abs(number), number.bit_length())
+    sign = '-' if number < 0 else ''
+    return sign + str(result)
+
+
+def scientific(number, digits):
+    """
+    Integer in scientific notation with given number of significant digits and count of all its digits
+
+    Only the leading bits of the number are converted, so this is fast even for huge integers.
+
+    :type number: int
+    :type digits: int
+    :rtype: Tuple[str, int]
+    """
+    if number == 0:
+        return f'{0:.{digits - 1}e}', 1
+    precision = digits + 10
+    keep = int(precision / LOG10_2) + 1
+    shift = max(abs(number).bit_length() - keep, 0)
+    with decimal.localcontext(_context(precision)) as context:
+        value = decimal.Decimal(abs(number) >> shift)
+        if shift:
+            value = value * context.power(2, shift)
+        count = value.adjusted() + 1
+        if shift:
+            # approximation near power of ten may be off by one digit, compare exactly
+            mantissa = value.scaleb(-value.adjusted())
+            if mantissa < BOUNDARY and abs(number) < 10 ** (count - 1):
+                count -= 1
+            elif mantissa > 10 - BOUNDARY + 1 and abs(number) >= 10 ** count:
+                count += 1
+    sign = '-' if number < 0 else ''
+    return f'{sign}{value:.{digits - 1}e}', count
+
+
+class Formatter:
+    style: str
+    digits: int
+
+    def __init__(self, style='default', digits=DIGITS):
+        """
+        :param style: one of FORMATS
+        :param digits: significant digits of scientific notation
+        """
+        self.style = style
+        self.digits = digits
+
+    def format(self, value):
+        """
+        :type value: Union[int, float, str]
+        :rtype: str
+        """
+        if type(value) is int:
+            return getattr(self, f'format_{self.style}')(value)
+        if type(value) is float:
+            if self.style == 'sci':
+                return f'{value:.{self.digits - 1}e}'
+            if self.style == 'hex':
+                return value.hex()
+        return str(value)
+
+    def format_default(self, value):
+        if value.bit_length() * LOG10_2 < MAX_DIGITS:
+            return str(value)
+        text, count = scientific(value, self.digits)
+        return f'{text} ({count} digits)'
+
+    def format_sci(self, value):
+        return scientific(value, self.digits)[0]
+
+    def format_hex(self, value):
+        return hex(value)
+
+    def format_bin(self, value):
+        return bin(value)
+
+    def format_full(self, value):
+        return int_to_decimal_string(value)
@@ -0,0 +1,177 @@
+"""
+Reverse-mode automatic differentiation
+
+The forward sweep evaluates the tree and records nodes in post-order on a tape,
+the backward sweep walks the tape in reverse and propagates adjoints from the
+root down to variables, so value and all partial derivatives are obtained in
+one pass each way. Inputs can be numbers or NumPy arrays.
+"""
+import math
+from typing import Dict, List
+from dataclasses import dataclass, field
+from calc_interpreter.lexer import TokenType
+from calc_interpreter.parser import NodeAST, BinaryOperator, UnaryOperator, Variable
+from calc_interpreter.traversal import NodeTraversal
+from calc_interpreter.exception import InterpreterError
+from calc_interpreter.operations import operator_func, strip_decimal, binary_operation, BITWISE_OPERATIONS
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover
+    numpy = None
+
+
+@dataclass
+class Gradient:
+    value: object
+    partials: Dict[str, object] = field(default_factory=dict)
+
+
+def is_scalar(value):
+    return type(value) in [int, float]
+
+
+def log(value):
+    if not is_scalar(value) and numpy is not None:
+        return numpy.log(value)
+    try:
+        return math.log(value)
+    except ValueError:
+        raise InterpreterError('grad error: derivative of power is undefined for non-positive base')
+
+
+def local_derivatives(operator, left, right, value, left_active=True, right_active=True):
+    """
+    Partial derivatives of binary operation with respect to its left and right operand
+
+    Derivatives with respect to inactive operands are not computed and are 0.
+
+    :type operator: TokenType
+    :param left_active: whether derivative with respect to the left operand is needed
+    :param right_active: whether derivative with respect to the right operand is needed
+    """
+    if operator == TokenType.PLUS:
+        return 1, 1
+    elif operator == TokenType.MINUS:
+        return 1, -1
+    elif operator == TokenType.MUL:
+        return right, left
+    elif operator == TokenType.DIV:
+        return 1 / right, -left / right ** 2
+    elif operator == TokenType.FLOOR_DIV:
+        return 0, 0
+    elif operator == TokenType.MODULUS:
+        return 1, -(left // right)
+    elif operator == TokenType.POW:
+        d_left = right * left ** (right - 1) if left_active else 0
+        if not right_active or (is_scalar(value) and value == 0):
+            # zero base raised to positive exponent stays zero
+            d_right = 0
+        else:
+            d_right = value * log(left)
+        return d_left, d_right
+
+
+class Differentiator(NodeTraversal):
+    variables: dict
+    tape: List[NodeAST]
+    values: dict
+    active: dict
+
+    def __init__(self, variables):
+        self.variables = variables
+        self.tape = []
+        self.values = {}
+        self.active = {}
+
+    def default(self, node):
+        raise InterpreterError('grad error: only expressions can be differentiated')
+
+    def record(self, node, value, active):
+        self.tape.append(node)
+        self.values[node] = value
+        self.active[node] = active
+        return value
+
+    def traverse_number(self, node):
+        """
+        :type node: Number
+        """
+        return self.record(node, strip_decimal(node.value), False)
+
+    def traverse_variable(self, node):
+        """
+        :type node: Variable
+        """
+        value = self.variables.get(node.value)
+        if value is None:
+            raise InterpreterError(f'undefined variable: {node.value}')
+        return self.record(node, value, True)
+
+    def traverse_unary_operator(self, node):
+        """
+        :type node: UnaryOperator
+        """
+        operator = node.operator.type
+        if operator == TokenType.BITWISE_NOT:
+            raise InterpreterError('grad error: bitwise operators are not differentiable')
+        right = self.traverse(node.expr)
+        value = -right if operator == TokenType.MINUS else +right
+        return self.record(node, value, self.active[node.expr])
+
+    def traverse_binary_operator(self, node):
+        """
+        :type node: BinaryOperator
+        """
+        operator = node.operator.type
+        if operator in BITWISE_OPERATIONS:
+            raise InterpreterError('grad error: bitwise operators are not differentiable')
+        left = self.traverse(node.left)
+        right = self.traverse(node.right)
+        if is_scalar(left) and is_scalar(right):
+            value = binary_operation(operator, left, right)
+        else:
+            value = operator_func(operator)(left, right)
+        return self.record(node, value, self.active[node.left] or self.active[node.right])
+
+    def backward(self, root):
+        """
+        :type root: NodeAST
+        :rtype: Dict[str, object]
+        """
+        partials = {node.value: 0 for node in self.tape if isinstance(node, Variable)}
+        adjoints = {root: 1}
+        for node in reversed(self.tape):
+            adjoint = adjoints.pop(node, None)
+            if adjoint is None or not self.active[node]:
+                continue
+            if isinstance(node, Variable):
+                partials[node.value] = partials[node.value] + adjoint
+            elif isinstance(node, UnaryOperator):
+                sign = -1 if node.operator.type == TokenType.MINUS else 1
+                adjoints[node.expr] = sign * adjoint
+            elif isinstance(node, BinaryOperator):
+                left, right = self.values[node.left], self.values[node.right]
+                try:
+                    d_left, d_right = local_derivatives(node.operator.type, left, right, self.values[node],
+                                                        self.active[node.left], self.active[node.right])
+                except ZeroDivisionError:
+                    raise InterpreterError('grad error: derivative is infinite')
+                if self.active[node.left]:
+                    adjoints[node.left] = adjoint * d_left
+                if self.active[node.right]:
+                    adjoints[node.right] = adjoint * d_right
+        return partials
+
+
+def grad(tree, variables=None):
+    """
+    Value of expression and its partial derivatives with respect to all variables in it
+
+    :type tree: NodeAST
+    :type variables: Optional[Dict[str, object]]
+    :rtype: Gradient
+    """
+    differentiator = Differentiator(variables or {})
+    value = differentiator.traverse(tree)
+    return Gradient(value, differentiator.backward(tree))
@@ -12,7 +12,7 @@ digit = 0-9
 import re
 from enum import Enum, auto, unique
 from typing import Optional
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from calc_interpreter.exception import InterpreterError
 
 
@@ -36,6 +36,7 @@ class TokenType(Enum):
     ASSIGN = '='
     IDENTIFIER = auto()
     MODE = 'mode'
+    FORMAT = 'format'
     NUMBER = auto()
     EOF = auto()
 
@@ -56,6 +57,8 @@ class TokenType(Enum):
 class Token:
     type: TokenType
     value: [float, int, str]
+    start: Optional[int] = field(default=None, compare=False)
+    end: Optional[int] = field(default=None, compare=False)
 
     def __repr__(self):
         return f'Token(type={self.type.name!r}, value={self.value!r})'
@@ -67,7 +70,7 @@ class Grammar:
     STRING = r'[A-Za-z\_]'
     IGNORE = r'[\s]'
     EXPONENT = r'[eE]'
-    KEYWORDS = ['mode']
+    KEYWORDS = ['mode', 'format']
 
     @staticmethod
     def is_number(char):
@@ -98,9 +101,11 @@ class Lexer:
     text: str
     current_char: Optional[str]
     position: int
+    start: int
 
     def __init__(self, text):
         self.text = text
+        self.start = 0
         self.position = 0
         self.current_char = self.text[self.position]
         self.tokens = []
@@ -119,7 +124,7 @@ class Lexer:
 
     def error(self, message=None):
         if not message:
-            message = f'unexpected character at {self.position+1}'
+            message = f'unexpected character at {self.start+self.position+1}'
         raise InterpreterError(message)
 
     def last_char(self):
@@ -183,18 +188,166 @@ class Lexer:
             if Grammar.is_ignored(self.current_char):
                 self.forward()
                 continue
+            start = self.position
             if Grammar.is_operator(self.current_char):
                 operator = self.operator()
                 token = Token(TokenType.get(operator), operator)
-                self.tokens.append(token)
-                return token
-            if Grammar.is_identifier(self.current_char):
+            elif Grammar.is_identifier(self.current_char):
                 token = self.identifier()
-                self.tokens.append(token)
-                return token
-            if Grammar.is_number(self.current_char):
+            elif Grammar.is_number(self.current_char):
                 token = Token(TokenType.NUMBER, self.number())
-                self.tokens.append(token)
-                return token
+            else:
+                self.error()
+            token.start, token.end = self.start + start, self.start + self.position
+            self.tokens.append(token)
+            return token
+        return Token(TokenType.EOF, 'EOF', self.start + self.position, self.start + self.position)
+
+
+class ByteGrammar:
+    """
+    Byte-level counterpart of Grammar, using lookup tables instead of regular expressions
+    """
+    DIGITS = frozenset(b'0123456789')
+    NUMBER = DIGITS | frozenset(b'.+-eE')
+    NUMBER_START = DIGITS | frozenset(b'.')
+    IDENTIFIER = frozenset(b'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz_')
+    IGNORE = frozenset(b' \t\n\r\x0b\x0c')
+    EXPONENT = frozenset(b'eE')
+    SIGN = frozenset(b'+-')
+    DOT = ord('.')
+    UNDERSCORE = ord('_')
+    NEWLINE = re.compile(rb'\n')
+    CARRIAGE_RETURN = ord('\r')
+    OPERATOR = frozenset(b'+-/*()~%^&<>|=')
+    OPERATORS = {ord(t.value): t for t in TokenType if type(t.value) is str and len(t.value) == 1}
+    DOUBLE_OPERATORS = {tuple(t.value.encode()): t for t in TokenType if type(t.value) is str and len(t.value) == 2}
+
+
+class ByteLexer(Lexer):
+    """
+    Lexer running directly over bytes-like buffers (bytes, bytearray, memoryview, mmap)
+
+    The buffer is never decoded nor copied, only numbers and identifiers are materialized
+    into token values. Use ByteLexer.statements to tokenize newline-separated statements
+    out of a single buffer. Token spans and error positions are offsets into the whole
+    buffer. Every lexer holds an export of the buffer, release it (or use the lexer as
+    context manager) before closing the underlying mmap.
+    """
+    text: memoryview
+    current_char: Optional[int]
+
+    def __init__(self, buffer, start=0, end=None):
+        view = memoryview(buffer).cast('B')
+        if end is None:
+            end = len(view)
+        self.text = view[start:end]
+        self.start = start
+        self.position = 0
+        self.current_char = self.text[0] if len(self.text) else None
+        self.tokens = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+    def release(self):
+        self.text.release()
+
+    @staticmethod
+    def statements(buffer):
+        """
+        Yield ByteLexer for each non-empty line of the buffer
+
+        :rtype: Iterator[ByteLexer]
+        """
+        view = memoryview(buffer).cast('B')
+        size = len(view)
+        position = 0
+        while position < size:
+            newline = ByteGrammar.NEWLINE.search(view, position)
+            end = newline.start() if newline else size
+            line_end = end
+            if line_end > position and view[line_end - 1] == ByteGrammar.CARRIAGE_RETURN:
+                line_end -= 1
+            if line_end > position:
+                yield ByteLexer(view, position, line_end)
+            position = end + 1
+
+    def number(self):
+        begin = self.position
+        size = 0
+        last = None
+        dot = exponent = underscore = False
+        while self.current_char is not None and (self.current_char in ByteGrammar.NUMBER
+                                                 or self.current_char == ByteGrammar.UNDERSCORE):
+            char = self.current_char
+            if char == ByteGrammar.UNDERSCORE:
+                underscore = True
+                self.forward()
+                continue
+            if char in ByteGrammar.EXPONENT:
+                if size == 0 or (size == 1 and dot) or self.last_char() or exponent:
+                    self.error()
+                exponent = True
+            elif char in ByteGrammar.SIGN:
+                if last not in ByteGrammar.EXPONENT:
+                    break
+            elif char == ByteGrammar.DOT:
+                if dot or exponent:
+                    self.error()
+                dot = True
+            last = char
+            size += 1
+            self.forward()
+
+        if last in ByteGrammar.EXPONENT or last in ByteGrammar.SIGN or (size == 1 and dot):
             self.error()
-        return Token(TokenType.EOF, 'EOF')
+
+        _num = bytes(self.text[begin:self.position])
+        if underscore:
+            _num = _num.replace(b'_', b'')
+        return Lexer.convert_number(_num)
+
+    def identifier(self):
+        begin = self.position
+        while self.current_char is not None and (self.current_char in ByteGrammar.IDENTIFIER
+                                                 or self.current_char in ByteGrammar.DIGITS):
+            self.forward()
+        _id = bytes(self.text[begin:self.position]).decode('ascii')
+        token_type = TokenType.get(_id, TokenType.IDENTIFIER)
+        return Token(token_type, _id)
+
+    def operator(self):
+        first = self.current_char
+        self.forward()
+        token_type = ByteGrammar.DOUBLE_OPERATORS.get((first, self.current_char))
+        if token_type:
+            self.forward()
+            return token_type
+        token_type = ByteGrammar.OPERATORS.get(first)
+        if not token_type:
+            self.error(f'unexpected character at {self.start+self.position}')
+        return token_type
+
+    def next_token(self):
+        while self.current_char is not None:
+            if self.current_char in ByteGrammar.IGNORE:
+                self.forward()
+                continue
+            start = self.position
+            if self.current_char in ByteGrammar.OPERATOR:
+                token_type = self.operator()
+                token = Token(token_type, token_type.value)
+            elif self.current_char in ByteGrammar.IDENTIFIER:
+                token = self.identifier()
+            elif self.current_char in ByteGrammar.NUMBER_START:
+                token = Token(TokenType.NUMBER, self.number())
+            else:
+                self.error()
+            token.start, token.end = self.start + start, self.start + self.position
+            self.tokens.append(token)
+            return token
+        return Token(TokenType.EOF, 'EOF', self.start + self.position, self.start + self.position)
@@ -0,0 +1,94 @@
+import math
+import operator as op_func
+from functools import partial
+from calc_interpreter.lexer import TokenType
+from calc_interpreter.exception import InterpreterError
+
+
+def operator_func(operator):
+    operations = {
+        TokenType.BITWISE_OR: op_func.or_,
+        TokenType.BITWISE_XOR: op_func.xor,
+        TokenType.BITWISE_AND: op_func.and_,
+        TokenType.BITWISE_RIGHT_SHIFT: op_func.rshift,
+        TokenType.BITWISE_LEFT_SHIFT: op_func.lshift,
+        TokenType.PLUS: op_func.add,
+        TokenType.MINUS: op_func.sub,
+        TokenType.MUL: op_func.mul,
+        TokenType.DIV: op_func.truediv,
+        TokenType.FLOOR_DIV: op_func.floordiv,
+        TokenType.MODULUS: op_func.mod,
+        TokenType.POW: op_func.pow
+    }
+    return operations[operator]
+
+
+def strip_decimal(number):
+    if type(number) is int:
+        return number
+    frac, whole = math.modf(number)
+    if frac == 0:
+        return int(whole)
+    return number
+
+
+BITWISE_OPERATIONS = [
+    TokenType.BITWISE_LEFT_SHIFT,
+    TokenType.BITWISE_RIGHT_SHIFT,
+    TokenType.BITWISE_XOR,
+    TokenType.BITWISE_OR,
+    TokenType.BITWISE_AND
+]
+
+
+def binary_operation(operator, left, right):
+    """
+    :type operator: TokenType
+    """
+    try:
+        operation = operator_func(operator)
+        integers = [type(left) is int, type(right) is int]
+        if operator in BITWISE_OPERATIONS and not all(integers):
+            raise InterpreterError('type error: operands must be integers')
+        result = operation(left, right)
+        if type(result) is complex:
+            raise InterpreterError('complex numbers not supported!')
+        return strip_decimal(result)
+    except ZeroDivisionError:
+        raise InterpreterError('zero division')
+
+
+def specialized_operation(operator):
+    """
+    Same as binary_operation with the operator bound ahead of time
+
+    :type operator: TokenType
+    :rtype: Callable[[Any, Any], Any]
+    """
+    if operator in BITWISE_OPERATIONS:
+        return partial(binary_operation, operator)
+    operation = operator_func(operator)
+
+    def arithmetic_operation(left, right):
+        try:
+            result = operation(left, right)
+        except ZeroDivisionError:
+            raise InterpreterError('zero division')
+        if type(result) is complex:
+            raise InterpreterError('complex numbers not supported!')
+        return strip_decimal(result)
+    return arithmetic_operation
+
+
+def unary_operation(operator, right):
+    """
+    :type operator: TokenType
+    """
+    if operator == TokenType.PLUS:
+        return +right
+    elif operator == TokenType.MINUS:
+        return -right
+    elif operator == TokenType.BITWISE_NOT:
+        if type(right) is not int:
+            raise InterpreterError('type error: operand must be integer')
+        return ~right
@@ -3,7 +3,7 @@ Syntax Analysis
 
 statement = command | bitwise_or | variable_assignment
 variable_assignment = variable '=' bitwise_or
-command = identifier {identifier}
+command = identifier {identifier | number}
 bitwise_or = bitwise_xor {'|' bitwise_xor}
 bitwise_xor = bitwise_and {'^' bitwise_and}
 bitwise_and = bitwise_shift {'&' bitwise_shift}
@@ -92,7 +92,7 @@ class Parser:
 
     def error(self, error=None):
         if not error:
-            error = f'syntax error at {self.lexer.position+1}'
+            error = f'syntax error at {self.lexer.start+self.lexer.position+1}'
         raise InterpreterError(error)
 
     def expect(self, token_type):
@@ -189,7 +189,10 @@ class Parser:
             self.expect(command.type)
             while self.token.type != TokenType.EOF:
                 arguments.append(self.token)
-                self.expect(TokenType.IDENTIFIER)
+                if self.token.type == TokenType.NUMBER:
+                    self.expect(TokenType.NUMBER)
+                else:
+                    self.expect(TokenType.IDENTIFIER)
             return Command(command, arguments)
 
     def statement(self):
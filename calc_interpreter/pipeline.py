@@ -0,0 +1,251 @@
+"""
+Columnar CSV evaluation
+
+Formulas are variable assignments, e.g. `total = price * qty`, the assigned name
+becomes a new column (it must not name an existing one) and referenced variables
+are bound to CSV columns or columns derived by earlier formulas. Input is
+read in chunks of rows, each formula is evaluated once per chunk over whole
+columns and the chunk is written out before the next one is read, so memory is
+bounded by the chunk size. Rows are padded or truncated to the width of the header.
+Cells which are not finite numbers, and rows for which the formula fails (e.g.
+zero division), produce empty output cells.
+"""
+import csv
+import math
+import time
+from itertools import islice
+from typing import List, Callable, Dict, Optional
+from dataclasses import dataclass
+from calc_interpreter.lexer import Lexer
+from calc_interpreter.parser import Parser, VariableAssignment
+from calc_interpreter.traversal import NodeTraversal
+from calc_interpreter.exception import InterpreterError
+from calc_interpreter.operations import strip_decimal, specialized_operation, unary_operation
+from calc_interpreter.formatter import Formatter
+
+CHUNK_SIZE = 10000
+
+Column = List[Optional[object]]
+CompiledColumn = Callable[[Dict[str, Column]], object]
+
+
+@dataclass
+class PipelineStats:
+    rows: int
+    seconds: float
+
+    @property
+    def rows_per_second(self):
+        if not self.seconds:
+            return float(self.rows)
+        return self.rows / self.seconds
+
+    def __str__(self):
+        return f'{self.rows} rows in {self.seconds:.3f}s ({self.rows_per_second:.0f} rows/sec)'
+
+
+def convert_cell(cell):
+    try:
+        value = strip_decimal(Lexer.convert_number(cell))
+    except (ValueError, OverflowError):
+        return None
+    if type(value) is float and not math.isfinite(value):
+        return None
+    return value
+
+
+def _broadcast(function, *operands):
+    """
+    Apply function element-wise, operands are either columns or scalars
+
+    Element is None whenever any of its operands is None or function fails for it,
+    e.g. on zero division, overflow or negative shift count.
+    """
+    def apply(*values):
+        if None in values:
+            return None
+        try:
+            return function(*values)
+        except (InterpreterError, ArithmeticError, ValueError):
+            return None
+
+    if not any(type(operand) is list for operand in operands):
+        return apply(*operands)
+    if len(operands) == 1:
+        return [apply(value) for value in operands[0]]
+    left, right = operands
+    if type(left) is not list:
+        return [apply(left, value) for value in right]
+    if type(right) is not list:
+        return [apply(value, right) for value in left]
+    return [apply(*values) for values in zip(left, right)]
+
+
+class ColumnCompiler(NodeTraversal):
+    """
+    Compiles AST into closures evaluating whole columns at once
+    """
+    names: List[str]
+
+    def __init__(self, names):
+        self.names = names
+
+    def compile(self, tree):
+        """
+        :type tree: NodeAST
+        :rtype: CompiledColumn
+        """
+        return self.traverse(tree)
+
+    def traverse_number(self, node):
+        """
+        :type node: Number
+        """
+        value = strip_decimal(node.value)
+
+        def number(columns):
+            return value
+        return number
+
+    def traverse_binary_operator(self, node):
+        """
+        :type node: BinaryOperator
+        """
+        left = self.traverse(node.left)
+        right = self.traverse(node.right)
+        operation = specialized_operation(node.operator.type)
+
+        def binary_operator(columns):
+            return _broadcast(operation, left(columns), right(columns))
+        return binary_operator
+
+    def traverse_unary_operator(self, node):
+        """
+        :type node: UnaryOperator
+        """
+        expr = self.traverse(node.expr)
+        operator = node.operator.type
+
+        def operation(value):
+            return unary_operation(operator, value)
+
+        def unary_operator(columns):
+            return _broadcast(operation, expr(columns))
+        return unary_operator
+
+    def traverse_variable(self, node):
+        """
+        :type node: Variable
+        """
+        name = node.value
+        if name not in self.names:
+            raise InterpreterError(f'undefined variable: {name}')
+
+        def variable(columns):
+            return columns[name]
+        return variable
+
+
+class _LazyColumns(dict):
+    """
+    Converts CSV columns into numbers on first access
+    """
+    def __init__(self, header, rows):
+        super().__init__()
+        self.indexes = {name: index for index, name in enumerate(header)}
+        self.rows = rows
+
+    def __missing__(self, name):
+        index = self.indexes[name]
+        column = [convert_cell(row[index]) if index < len(row) else None for row in self.rows]
+        self[name] = column
+        return column
+
+
+class Pipeline:
+    header: List[str]
+    formulas: List[VariableAssignment]
+    compiled: List[CompiledColumn]
+    chunk_size: int
+    formatter: Formatter
+
+    def __init__(self, header, formulas, chunk_size=CHUNK_SIZE, formatter=None):
+        """
+        :type header: List[str]
+        :type formulas: List[str]
+        :type chunk_size: int
+        :type formatter: Optional[Formatter]
+        """
+        if not formulas:
+            raise InterpreterError('at least one formula is required')
+        self.header = header
+        self.chunk_size = chunk_size
+        self.formatter = formatter or Formatter('full')
+        self.formulas = []
+        self.compiled = []
+        names = list(header)
+        for formula in formulas:
+            tree = Parser(Lexer(formula)).parse()
+            if not isinstance(tree, VariableAssignment):
+                raise InterpreterError(f'formula must assign a column, e.g. total = price * qty: {formula}')
+            if tree.left.value in names:
+                raise InterpreterError(f'column already exists: {tree.left.value}')
+            self.formulas.append(tree)
+            self.compiled.append(ColumnCompiler(names).compile(tree.right))
+            names.append(tree.left.value)
+
+    @property
+    def output_header(self):
+        return self.header + [formula.left.value for formula in self.formulas]
+
+    def evaluate_chunk(self, rows):
+        """
+        :type rows: List[List[str]]
+        :rtype: List[List[str]]
+        """
+        columns = _LazyColumns(self.header, rows)
+        derived = []
+        for formula, compiled in zip(self.formulas, self.compiled):
+            result = compiled(columns)
+            if type(result) is not list:
+                result = [result] * len(rows)
+            columns[formula.left.value] = result
+            derived.append(['' if value is None else self.formatter.format(value) for value in result])
+        width = len(self.header)
+        return [row[:width] + [''] * (width - len(row)) + list(values) for row, values in zip(rows, zip(*derived))]
+
+    def run(self, reader, writer):
+        """
+        :type reader: Iterator[List[str]]
+        :param writer: csv writer
+        :rtype: PipelineStats
+        """
+        start = time.perf_counter()
+        rows = 0
+        writer.writerow(self.output_header)
+        while True:
+            chunk = list(islice(reader, self.chunk_size))
+            if not chunk:
+                break
+            writer.writerows(self.evaluate_chunk(chunk))
+            rows += len(chunk)
+        return PipelineStats(rows, time.perf_counter() - start)
+
+
+def evaluate_csv(source, destination, formulas, chunk_size=CHUNK_SIZE):
+    """
+    Evaluate formulas over CSV read from source and write it with derived columns to destination
+
+    :param source: text file opened with newline=''
+    :param destination: text file opened with newline=''
+    :type formulas: List[str]
+    :type chunk_size: int
+    :rtype: PipelineStats
+    """
+    reader = csv.reader(source)
+    try:
+        header = next(reader)
+    except StopIteration:
+        raise InterpreterError('csv error: missing header')
+    pipeline = Pipeline(header, formulas, chunk_size)
+    return pipeline.run(reader, csv.writer(destination))
@@ -0,0 +1,198 @@
+"""
+Per-node profiling of evaluation
+
+ProfilingEvaluator times every traversed node and attributes the time to the
+node's source span. Results are exported as collapsed stacks for flamegraph
+tools, or as annotated AST. The plain Evaluator is not instrumented at all.
+"""
+import time
+from typing import Dict, Tuple
+from dataclasses import dataclass
+from calc_interpreter.lexer import Lexer
+from calc_interpreter.parser import Parser, NodeAST, BinaryOperator, UnaryOperator, VariableAssignment, Command
+from calc_interpreter.traversal import NodeTraversal
+from calc_interpreter.evaluator import Evaluator
+
+Span = Tuple[int, int]
+
+
+@dataclass
+class NodeProfile:
+    label: str
+    span: Span
+    calls: int = 0
+    total: int = 0
+    self_time: int = 0
+
+
+class SpanResolver(NodeTraversal):
+    """
+    Resolves source span of every node from positions of its tokens
+    """
+    spans: Dict[NodeAST, Span]
+
+    def __init__(self):
+        self.spans = {}
+
+    def resolve(self, node):
+        """
+        :type node: NodeAST
+        :rtype: Span
+        """
+        span = self.spans.get(node)
+        if span is None:
+            span = self.spans[node] = self.traverse(node)
+        return span
+
+    def traverse_number(self, node):
+        return node.token.start, node.token.end
+
+    traverse_variable = traverse_number
+
+    def traverse_binary_operator(self, node):
+        return self.resolve(node.left)[0], self.resolve(node.right)[1]
+
+    def traverse_unary_operator(self, node):
+        return node.operator.start, self.resolve(node.expr)[1]
+
+    def traverse_variable_assignment(self, node):
+        return self.resolve(node.left)[0], self.resolve(node.right)[1]
+
+    def traverse_command(self, node):
+        last = node.arguments[-1] if node.arguments else node.operation
+        return node.operation.start, last.end
+
+
+def node_label(node):
+    """
+    :type node: NodeAST
+    :rtype: str
+    """
+    if isinstance(node, (BinaryOperator, UnaryOperator)):
+        return node.operator.value
+    if isinstance(node, VariableAssignment):
+        return f'{node.left.value} ='
+    if isinstance(node, Command):
+        return node.operation.value
+    return str(node.value)
+
+
+def node_children(node):
+    """
+    :type node: NodeAST
+    :rtype: List[NodeAST]
+    """
+    if isinstance(node, BinaryOperator):
+        return [node.left, node.right]
+    if isinstance(node, UnaryOperator):
+        return [node.expr]
+    if isinstance(node, VariableAssignment):
+        return [node.right]
+    return []
+
+
+def format_time(nanoseconds):
+    if nanoseconds >= 1_000_000:
+        return f'{nanoseconds / 1_000_000:.3f}ms'
+    return f'{nanoseconds / 1000:.1f}us'
+
+
+class ProfilingEvaluator(Evaluator):
+    """
+    Evaluator recording time and call count of each node, keyed by its source span
+
+    Times are in nanoseconds, self time excludes time spent in child nodes.
+    Expressions are always interpreted, never compiled, so every node is visible.
+    """
+    profiles: Dict[Tuple[Span, str], NodeProfile]
+    stacks: Dict[Tuple[str, ...], int]
+
+    def __init__(self, tree):
+        super().__init__(tree)
+        self.threshold = None
+        self.reset()
+
+    def reset(self):
+        self.resolver = SpanResolver()
+        self.profiles = {}
+        self.stacks = {}
+        self._frames = []
+        self._children_time = []
+
+    def profile(self, node):
+        """
+        :type node: NodeAST
+        :rtype: NodeProfile
+        """
+        span = self.resolver.resolve(node)
+        label = node_label(node)
+        key = span, label
+        profile = self.profiles.get(key)
+        if profile is None:
+            profile = self.profiles[key] = NodeProfile(label, span)
+        return profile
+
+    def traverse(self, node):
+        profile = self.profile(node)
+        self._frames.append(f'{profile.label} [{profile.span[0]}:{profile.span[1]}]')
+        self._children_time.append(0)
+        start = time.perf_counter_ns()
+        try:
+            return super().traverse(node)
+        finally:
+            elapsed = time.perf_counter_ns() - start
+            self_time = elapsed - self._children_time.pop()
+            if self._children_time:
+                self._children_time[-1] += elapsed
+            profile.calls += 1
+            profile.total += elapsed
+            profile.self_time += self_time
+            stack = tuple(self._frames)
+            self.stacks[stack] = self.stacks.get(stack, 0) + self_time
+            self._frames.pop()
+
+    def collapsed(self):
+        """
+        Collapsed stacks (one `frame;frame;frame nanoseconds` per line) for flamegraph tools
+
+        :rtype: str
+        """
+        return '\n'.join(f'{";".join(stack)} {nanoseconds}' for stack, nanoseconds in self.stacks.items())
+
+    def annotate(self, tree=None):
+        """
+        AST of profiled tree with costs per node
+
+        :type tree: Optional[NodeAST]
+        :rtype: str
+        """
+        lines = []
+
+        def walk(node, prefix, child_prefix):
+            profile = self.profile(node)
+            lines.append(f'{prefix}{profile.label} [{profile.span[0]}:{profile.span[1]}] calls={profile.calls} '
+                         f'total={format_time(profile.total)} self={format_time(profile.self_time)}')
+            children = node_children(node)
+            for index, child in enumerate(children):
+                last = index == len(children) - 1
+                branch, indent = ('└── ', '    ') if last else ('├── ', '│   ')
+                walk(child, child_prefix + branch, child_prefix + indent)
+
+        walk(tree or self.tree, '', '')
+        return '\n'.join(lines)
+
+
+def profile(data, repeat=1):
+    """
+    Evaluate data repeat times with ProfilingEvaluator
+
+    :type data: str
+    :type repeat: int
+    :rtype: ProfilingEvaluator
+    """
+    tree = Parser(Lexer(data)).parse()
+    evaluator = ProfilingEvaluator(tree)
+    evaluator.reset()
+    for _ in range(repeat):
+        evaluator.evaluate()
+    return evaluator
@@ -1,13 +1,22 @@
+import io
+import decimal
+import mmap
 import pytest
 from calc_interpreter.exception import InterpreterError
-from calc_interpreter.lexer import Lexer, Token, TokenType
+from calc_interpreter.lexer import Lexer, ByteLexer, Token, TokenType
 from calc_interpreter.parser import Parser
 from calc_interpreter.evaluator import Evaluator, interpret
+from calc_interpreter.pipeline import evaluate_csv
+from calc_interpreter.gradient import grad
+from calc_interpreter.profiler import ProfilingEvaluator, profile
+from calc_interpreter.cache import ResultCache
+from calc_interpreter.formatter import Formatter, int_to_decimal_string, scientific
 
 
 @pytest.fixture(autouse=True)
 def clear_evaluator():
     Evaluator.clear()
+    ProfilingEvaluator.clear()
 
 
 def test_number():
@@ -91,6 +100,17 @@ def test_ans():
         assert output == result
 
 
+def test_big_integers():
+    expressions = ['2 ** 60 + 1', '3 ** 2 ** 16']
+    results = [2 ** 60 + 1, 3 ** 2 ** 16]
+    for expression, result in zip(expressions, results):
+        lexer = Lexer(expression)
+        parser = Parser(lexer)
+        tree = parser.parse()
+        evaluator = Evaluator(tree)
+        assert evaluator.evaluate() == result
+
+
 def test_command_mode_usage(capsys):
     operations = ['mode', 'mode __idk__']
     usage = 'usage: mode (ast | rpn | tokens | default)\n'
@@ -110,11 +130,11 @@ def test_command_mode_rpn(capsys):
 
 
 def test_mode_tokens(capsys):
-    operations = ['mode tokens', '5+3']
+    operations = ['mode tokens', '5+3', 'format hex', '5+3']
     tokens = [Token(TokenType.NUMBER, 5), Token(TokenType.PLUS, '+'), Token(TokenType.NUMBER, 3), '']
     tokens = [str(token) for token in tokens]
     tokens = '\n'.join(tokens)
-    results = ['switching to mode: tokens\n', tokens]
+    results = ['switching to mode: tokens\n', tokens, 'switching to format: hex\n', tokens]
     for operation, result in zip(operations, results):
         interpret(operation)
         output, _ = capsys.readouterr()
@@ -125,3 +145,285 @@ def test_interpret(capsys):
     interpret('25 + 5')
     output, _ = capsys.readouterr()
     assert output == '30\n'
+
+
+def test_byte_lexer_number():
+    valid_numbers = open('tests/data/valid_numbers.txt', 'rb').readlines()
+    for line in valid_numbers:
+        number, calculated = line.split()
+        lexer = ByteLexer(memoryview(number))
+        token = lexer.next_token()
+        assert token.type == TokenType.NUMBER
+        assert token.value == float(calculated)
+
+
+def test_byte_lexer_expressions():
+    expressions = open('tests/data/expressions.txt', 'rb').read()
+    for line in ByteLexer.statements(expressions):
+        separator = expressions.index(b'=', line.start)
+        result = expressions[separator + 1:line.start + len(line.text)]
+        lexer = ByteLexer(expressions, line.start, separator)
+        parser = Parser(lexer)
+        tree = parser.parse()
+        evaluator = Evaluator(tree)
+        assert str(evaluator.evaluate()) == result.strip().decode()
+
+
+def test_byte_lexer_invalid_numbers():
+    numbers = open('tests/data/invalid_numbers.txt', 'rb').read()
+    for lexer in ByteLexer.statements(numbers):
+        with pytest.raises(InterpreterError):
+            parser = Parser(lexer)
+            tree = parser.parse()
+            evaluator = Evaluator(tree)
+            evaluator.evaluate()
+
+
+def test_byte_lexer_statements_memoryview():
+    buffer = bytearray(b'1 + 2\n\n3 * 4\r\n5')
+    statements = [(lexer.start, bytes(lexer.text)) for lexer in ByteLexer.statements(memoryview(buffer))]
+    assert statements == [(0, b'1 + 2'), (7, b'3 * 4'), (14, b'5')]
+
+
+def test_byte_lexer_mmap(tmp_path):
+    path = tmp_path / 'statements.txt'
+    path.write_bytes(b'a = 2 ** 10\r\n\nb = a >> 2\nb - 6')
+    results = [None, None, 250]
+    with open(path, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+        lexers = list(ByteLexer.statements(buffer))
+        assert [lexer.start for lexer in lexers] == [0, 14, 25]
+        for lexer, result in zip(lexers, results):
+            with lexer:
+                evaluator = Evaluator(Parser(lexer).parse())
+                assert evaluator.evaluate() == result
+
+
+def test_tiered_expressions():
+    expressions = open('tests/data/expressions.txt').readlines()
+    expressions = [expression.split('=') for expression in expressions]
+    evaluator = Evaluator(None)
+    evaluator.threshold = 1
+    for expression, result in expressions:
+        tree = Parser(Lexer(expression)).parse()
+        evaluator = Evaluator(tree)
+        values = [evaluator.evaluate() for _ in range(3)]
+        assert evaluator.stats().tier == 'compiled'
+        assert evaluator.stats().evaluations == 3
+        assert [str(value) for value in values] == [result.strip()] * 3
+
+
+def test_tiered_promotion():
+    evaluator = Evaluator(Parser(Lexer('x = 3')).parse())
+    evaluator.evaluate()
+    evaluator.threshold = 2
+    tree = Parser(Lexer('x * 2 + 1')).parse()
+    evaluator = Evaluator(tree)
+    tiers = []
+    for _ in range(4):
+        evaluator.evaluate()
+        tiers.append(evaluator.stats(tree).tier)
+    assert tiers == ['interpreted', 'interpreted', 'compiled', 'compiled']
+    assert evaluator.memory['ans'] == 7
+
+
+def test_tiered_errors():
+    evaluator = Evaluator(None)
+    evaluator.threshold = 0
+    expressions = ['~2.1', '2 << 1.2', '1 / 0', '5 % 0', 'undefined + 1', 'ans = 2', '(-8) ** .5']
+    for expression in expressions:
+        tree = Parser(Lexer(expression)).parse()
+        with pytest.raises(InterpreterError):
+            Evaluator(tree).evaluate()
+        assert evaluator.stats(tree).tier == 'compiled'
+
+
+def test_csv_pipeline():
+    source = io.StringIO('a,b,label\n2,3,x\n.5,0,y\n,1,z\n4,2\n7,1,w\n10.5,400,v\n2,-1,u\n1,2,t,3\nnan,Infinity,s\n')
+    destination = io.StringIO()
+    formulas = ['c = (a + 1) * b', 'd = c / b', 'e = ~b << 2', 'f = 2 ** 3', 'g = a ** b', 'h = a << b']
+    stats = evaluate_csv(source, destination, formulas, chunk_size=2)
+    assert stats.rows == 9
+    assert stats.rows_per_second > 0
+    assert destination.getvalue().splitlines() == [
+        'a,b,label,c,d,e,f,g,h',
+        '2,3,x,9,3,-16,8,8,16',
+        '.5,0,y,0,,-4,8,1,',
+        ',1,z,,,-8,8,,',
+        '4,2,,10,5,-12,8,16,16',
+        '7,1,w,8,8,-8,8,7,14',
+        '10.5,400,v,4600,11.5,-1604,8,,',
+        '2,-1,u,-3,3,0,8,0.5,',
+        '1,2,t,4,2,-12,8,1,4',
+        'nan,Infinity,s,,,,8,,'
+    ]
+
+
+def test_csv_pipeline_errors():
+    formulas = [[], ['a + 1'], ['c = undefined * 2'], ['a = a * 2'], ['c = a', 'c = b']]
+    for formula in formulas:
+        with pytest.raises(InterpreterError):
+            evaluate_csv(io.StringIO('a,b\n1,2\n'), io.StringIO(), formula)
+
+
+def test_grad():
+    variables = {'x': 7.5, 'y': 2}
+    expressions = [
+        ('x * y + x ** 2 - y / x', 70.98333333333333, {'x': 17.0355555556, 'y': 7.3666666667}),
+        ('x % y + x // y - -x', 12, {'x': 2, 'y': -3}),
+        ('+x ** y', 56.25, {'x': 15, 'y': 113.3382949}),
+        ('0 ** y + 2 ** y', 4, {'y': 2.7725887222}),
+        ('5 * 3', 15, {})
+    ]
+    for expression, value, partials in expressions:
+        gradient = grad(Parser(Lexer(expression)).parse(), variables)
+        assert gradient.value == pytest.approx(value)
+        assert gradient.partials == pytest.approx(partials)
+
+
+def test_grad_finite_differences():
+    tree = Parser(Lexer('(x - 2 * y) ** 3 / (y + x % 3)')).parse()
+    variables = {'x': 4.2, 'y': 1.3}
+    gradient = grad(tree, variables)
+    evaluator = Evaluator(tree)
+    for name in variables:
+        step = 1e-6
+        values = []
+        for delta in [step, -step]:
+            evaluator.memory.update(variables)
+            evaluator.memory[name] += delta
+            values.append(evaluator.evaluate())
+        assert gradient.partials[name] == pytest.approx((values[0] - values[1]) / (2 * step), rel=1e-5)
+
+
+def test_grad_errors():
+    expressions = ['x & 1', 'x << 2', '~x', 'mode rpn', 'a = x', 'z * 2', 'x / 0', '0 ** -1']
+    for expression in expressions:
+        with pytest.raises(InterpreterError):
+            grad(Parser(Lexer(expression)).parse(), {'x': 1})
+
+
+def test_grad_numpy():
+    numpy = pytest.importorskip('numpy')
+    x = numpy.array([1.0, 2.0, 3.0])
+    gradient = grad(Parser(Lexer('x ** 2 * y + y')).parse(), {'x': x, 'y': 2})
+    assert numpy.allclose(gradient.value, x ** 2 * 2 + 2)
+    assert numpy.allclose(gradient.partials['x'], 4 * x)
+    assert numpy.allclose(gradient.partials['y'], x ** 2 + 1)
+
+
+def test_token_positions():
+    for lexer in [Lexer('(25 - x) ** 2'), ByteLexer(b'(25 - x) ** 2')]:
+        spans = []
+        token = lexer.next_token()
+        while token.type != TokenType.EOF:
+            spans.append((token.start, token.end))
+            token = lexer.next_token()
+        assert spans == [(0, 1), (1, 3), (4, 5), (6, 7), (7, 8), (9, 11), (12, 13)]
+    lexer = list(ByteLexer.statements(b'x = 1\n(25 - x) ** 2'))[1]
+    assert [(token.start, token.end) for token in [lexer.next_token(), lexer.next_token()]] == [(6, 7), (7, 9)]
+    with pytest.raises(InterpreterError, match='unexpected character at 9'):
+        Parser(list(ByteLexer.statements(b'x = 1\n2 $ 3'))[1]).parse()
+    with pytest.raises(InterpreterError, match='syntax error at 12'):
+        Parser(list(ByteLexer.statements(b'x = 1\n2 + )'))[1]).parse()
+
+
+def test_profiler():
+    evaluator = profile('2 ** 3 + -1', repeat=4)
+    assert evaluator.memory['ans'] == 7
+    profiles = {(profile.label, profile.span): profile for profile in evaluator.profiles.values()}
+    assert set(profiles) == {('+', (0, 11)), ('**', (0, 6)), ('2', (0, 1)), ('3', (5, 6)), ('-', (9, 11)),
+                             ('1', (10, 11))}
+    assert all(profile.calls == 4 for profile in profiles.values())
+    root = profiles[('+', (0, 11))]
+    assert root.total == sum(profile.self_time for profile in profiles.values())
+    assert evaluator.annotate().splitlines()[0].startswith('+ [0:11] calls=4 total=')
+    assert [line.split('[')[0] for line in evaluator.annotate().splitlines()] == [
+        '+ ', '├── ** ', '│   ├── 2 ', '│   └── 3 ', '└── - ', '    └── 1 '
+    ]
+    stacks = [line.rsplit(' ', 1) for line in evaluator.collapsed().splitlines()]
+    assert [stack for stack, _ in stacks] == [
+        '+ [0:11];** [0:6];2 [0:1]', '+ [0:11];** [0:6];3 [5:6]', '+ [0:11];** [0:6]',
+        '+ [0:11];- [9:11];1 [10:11]', '+ [0:11];- [9:11]', '+ [0:11]'
+    ]
+    assert sum(int(nanoseconds) for _, nanoseconds in stacks) == root.total
+
+
+def test_profiler_disabled(capsys):
+    evaluator = profile('1 + 2')
+    calls = {key: profile.calls for key, profile in evaluator.profiles.items()}
+    interpret('1 + 2')
+    assert capsys.readouterr()[0] == '3\n'
+    assert Evaluator(None) is not evaluator
+    assert not hasattr(Evaluator(None), 'profiles')
+    assert {key: profile.calls for key, profile in evaluator.profiles.items()} == calls
+
+
+def test_cache_key(tmp_path):
+    cache = ResultCache(str(tmp_path / 'cache.db'))
+    keys = [cache.key(Parser(Lexer(expression)).parse()) for expression in ['2 ** 3', '(2.0) ** 3', '2 * 3']]
+    assert keys[0] == keys[1] != keys[2]
+    for expression in ['x ** 3', 'a = 2', 'mode rpn']:
+        assert cache.key(Parser(Lexer(expression)).parse()) is None
+
+
+def test_cache_evaluator(tmp_path):
+    path = str(tmp_path / 'cache.db')
+    expressions = ['3 ** 200 >> 7', 'a = 3 ** 200 >> 7', '1 / 3', 'a + 1']
+    results = []
+    for _ in range(2):
+        Evaluator.clear()
+        evaluator = Evaluator(None)
+        evaluator.cache = ResultCache(path, min_duration=0)
+        results.append([Evaluator(Parser(Lexer(expression)).parse()).evaluate() for expression in expressions])
+        assert evaluator.memory['a'] == 3 ** 200 >> 7
+    assert results[0] == results[1] == [3 ** 200 >> 7, None, 1 / 3, (3 ** 200 >> 7) + 1]
+    cache = ResultCache(path)
+    assert cache.connection.execute('SELECT COUNT(*) FROM results').fetchone()[0] == 2
+    cache.connection.execute('UPDATE results SET value = ?', (b'\x2a',))
+    assert Evaluator(Parser(Lexer('3 ** 200 >> 7')).parse()).evaluate() == 42
+
+
+def test_cache_eviction(tmp_path):
+    path = str(tmp_path / 'cache.db')
+    cache = ResultCache(path, max_size=20, access_interval=0)
+    other = ResultCache(path, max_size=20, access_interval=0)
+    cache.put('a', 2 ** 64)
+    other.put('b', -1.5)
+    assert other.get('a') == 2 ** 64
+    cache.put('c', 2 ** 40)
+    assert [cache.get(key) for key in 'abc'] == [2 ** 64, None, 2 ** 40]
+    other.put('d', 2 ** 200)
+    cache.put('c', 2 ** 8)
+    assert [cache.get(key) for key in 'abcd'] == [2 ** 64, None, 2 ** 8, None]
+    total, size = cache.connection.execute('SELECT total, (SELECT SUM(size) FROM results) FROM meta').fetchone()
+    assert total == size == 11
+    reader = ResultCache(path)
+    changes = reader.connection.total_changes
+    assert reader.get('a') == 2 ** 64
+    assert reader.connection.total_changes == changes
+
+
+def test_command_format(capsys):
+    operations = ['2 ** 20000', 'format hex', '255', '-1.5', 'format bin', '5 ^ 3', 'format sci 3', '123456',
+                  'format default', '10 ** 4001 - 1', 'format', 'format sci 0', 'format sci x', 'format full']
+    results = ['3.980276840337967e+6020 (6021 digits)', 'switching to format: hex', '0xff', '-0x1.8000000000000p+0',
+               'switching to format: bin', '0b110', 'switching to format: sci', '1.23e+5',
+               'switching to format: default', '1.00e+4001 (4001 digits)']
+    results += ['usage: format (default | sci | hex | bin | full) [digits]'] * 3 + ['switching to format: full']
+    for operation, result in zip(operations, results):
+        interpret(operation)
+        output, _ = capsys.readouterr()
+        assert output == result + '\n'
+
+
+def test_formatter():
+    numbers = [0, -7, 10 ** 4000, 10 ** 4001 - 1, -3 ** 20000, 2 ** 65536 + 1]
+    for number in numbers:
+        text = int_to_decimal_string(number)
+        assert int(decimal.Decimal(text)) == number
+        assert scientific(number, 5)[1] == len(text.lstrip('-'))
+    assert scientific(-3 ** 20000, 5)[0] == '-2.6613e+9542'
+    assert Formatter('full').format(-3 ** 20000) == int_to_decimal_string(-3 ** 20000)
+    assert Formatter('sci', 4).format(0.000123456) == '1.235e-04'
+    assert Formatter('bin').format(2.5) == '2.5'
+    assert Formatter('hex').format('5 3 +') == '5 3 +'